@@ -9,20 +9,66 @@ Fetches data from PubChem + RCSB PDB, then runs the
 Usage:
   1. Copy .env.example → .env and fill in your NVIDIA_API_KEY
   2. pip install -r requirements.txt
-  3. python biocore_agent.py
+  3. python biocore_agent.py            (local dev)
+     gunicorn biocore_agent:app          (concurrent serving, see gunicorn.conf.py)
   4. In a separate terminal: ngrok http 5000
   5. Paste the ngrok URL into the n8n bridge workflow
 """
 
 import os
-import json
+import re
+import queue
+import atexit
+import logging
+import logging.handlers
+import threading
+import orjson
 import requests
-from flask import Flask, request, jsonify
+from cachetools import TTLCache
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from urllib.parse import quote
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from flask import Flask, Response, request, stream_with_context
+from flask.json.provider import JSONProvider
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# ── Logging ───────────────────────────────────────────────────
+# Request threads only enqueue records; a background listener does the
+# blocking stdout writes, so concurrent requests don't contend on stdout.
+_log_queue    = queue.Queue(-1)
+_log_handler  = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter("[BioCore] %(message)s"))
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+log = logging.getLogger("biocore")
+log.addHandler(logging.handlers.QueueHandler(_log_queue))
+log.setLevel(logging.INFO)
+log.propagate = False   # avoid duplicate lines under Gunicorn's root handlers
+
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+
+
+def ojson(obj, status=200):
+    """Serialise obj once with orjson and return it as a JSON response."""
+    return Response(orjson.dumps(obj), status=status, mimetype="application/json")
 
 # ── Config (loaded from .env) ─────────────────────────────────
 NVIDIA_API_KEY = os.environ.get("NVIDIA_API_KEY", "")
@@ -30,8 +76,40 @@ NVIDIA_MODEL   = os.environ.get("NVIDIA_MODEL", "NVIDIABuild-Autogen-12")
 NVIDIA_URL     = "https://integrate.api.nvidia.com/v1/chat/completions"
 PORT           = int(os.environ.get("PORT", 5000))
 
+# Input validation — reject malformed IDs/names before any network I/O
+# (used with fullmatch, so no anchors — "$" would also accept a trailing newline)
+_PDB_RE  = re.compile(r"[0-9][A-Za-z0-9]{3}")
+_NAME_RE = re.compile(r"[A-Za-z0-9 ,.\-_'()\[\]+/]{1,200}")
+
+# Pool for the PubChem lookup that runs alongside the request thread's own
+# RCSB fetch. Threads are spawned lazily (and are greenlets under Gunicorn's
+# gevent workers), so size it above the server's concurrency — 200 worker
+# connections in gunicorn.conf.py — rather than letting it cap requests.
+EXECUTOR = ThreadPoolExecutor(max_workers=int(os.environ.get("FETCH_WORKERS", 256)))
+
+# In-process caches for upstream lookups — compound/structure data changes
+# on the order of months, so a day's TTL is safe
+_PC       = TTLCache(maxsize=4096, ttl=86400)
+_PDB      = TTLCache(maxsize=4096, ttl=86400)
+_PC_LOCK  = threading.Lock()
+_PDB_LOCK = threading.Lock()
+
+# In-flight upstream lookups, so concurrent requests for the same key share one fetch
+_INFLIGHT      = {}
+_INFLIGHT_LOCK = threading.Lock()
+
+# One keep-alive session for all upstreams (PubChem, RCSB, NVIDIA).
+# HTTP/1.1 is enough here: each request makes a single call per host, so
+# there is nothing to multiplex, and requests already negotiates gzip.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=64,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504]),
+))
+
 if not NVIDIA_API_KEY:
-    print("⚠️  WARNING: NVIDIA_API_KEY not set. Copy .env.example → .env and add your key.")
+    log.warning("⚠️  WARNING: NVIDIA_API_KEY not set. Copy .env.example → .env and add your key.")
 
 # ── BioCore System Prompt ─────────────────────────────────────
 SYSTEM_PROMPT = """You are BioCore, a specialized biochemistry and biophysics AI agent. Execute the full 7-step analysis protocol on every payload.
@@ -54,134 +132,334 @@ STEP 7 - SYNTHESIS REPORT with mandatory sections:
 Rules: Never hallucinate data not in the payload. Always cite the biochemical principle behind each conclusion. Quantify everything with delta-G, Kd, IC50, RMSD, distances in Angstroms. Flag uncertainty. Use markdown headers, tables, code blocks, bold for critical values. Begin STEP 1 immediately with no preamble."""
 
 
+# ── Request coalescing ────────────────────────────────────────
+def _single_flight(key, fn):
+    """
+    Run fn() once per key across concurrent callers.
+
+    The first caller runs the fetch on its own thread; callers arriving
+    while it is in flight block on the same Future and get its result.
+    """
+    with _INFLIGHT_LOCK:
+        fut = _INFLIGHT.get(key)
+        leader = fut is None
+        if leader:
+            fut = _INFLIGHT[key] = Future()
+
+    if not leader:
+        return fut.result()
+
+    try:
+        result = fn()
+        fut.set_result(result)
+        return result
+    except BaseException as e:
+        fut.set_exception(e)
+        raise
+    finally:
+        with _INFLIGHT_LOCK:
+            _INFLIGHT.pop(key, None)
+
+
 # ── PubChem ───────────────────────────────────────────────────
+_PUBCHEM_PROPS = (
+    "IUPACName,MolecularFormula,MolecularWeight,ExactMass,"
+    "CanonicalSMILES,InChI,InChIKey,XLogP,TPSA,"
+    "HBondDonorCount,HBondAcceptorCount,RotatableBondCount,"
+    "HeavyAtomCount,Charge,Complexity"
+)
+_PUBCHEM_URL_CID  = f"https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/cid/{{}}/property/{_PUBCHEM_PROPS}/JSON"
+_PUBCHEM_URL_NAME = f"https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/name/{{}}/property/{_PUBCHEM_PROPS}/JSON"
+
+_PUBCHEM_UNAVAILABLE = {"_error": "PubChem fetch failed: service unavailable"}
+
+
+@lru_cache(maxsize=2048)
+def _quote(name):
+    """URL-quote a compound name; popular names repeat, so memoise."""
+    return quote(name)
+
+
 def fetch_pubchem(compound_name=None, cid=None):
-    """Fetch compound data from PubChem PUG REST API."""
-    try:
-        props = (
-            "IUPACName,MolecularFormula,MolecularWeight,ExactMass,"
-            "CanonicalSMILES,InChI,InChIKey,XLogP,TPSA,"
-            "HBondDonorCount,HBondAcceptorCount,RotatableBondCount,"
-            "HeavyAtomCount,Charge,Complexity"
-        )
-        if cid:
-            url = f"https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/cid/{cid}/property/{props}/JSON"
-        else:
-            encoded = requests.utils.quote(compound_name)
-            url = f"https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/name/{encoded}/property/{props}/JSON"
+    """
+    Fetch compound data from PubChem, served from cache / in-flight fetch
+    when possible. compound_name must already be stripped.
+    """
+    key = ("cid", cid) if cid else ("name", compound_name.lower())
+    with _PC_LOCK:
+        cached = _PC.get(key)
+    if cached is not None:
+        return cached
 
-        res = requests.get(url, timeout=15)
-        raw = res.json()
+    def load():
+        result = _fetch_pubchem(compound_name=compound_name, cid=cid)
+        if "_error" not in result:
+            with _PC_LOCK:
+                _PC[key] = result
+        return result
 
-        if "PropertyTable" not in raw or not raw["PropertyTable"]["Properties"]:
-            return {"_error": f"PubChem returned no results for: {compound_name or cid}"}
+    return _single_flight(("pubchem",) + key, load)
 
-        p = raw["PropertyTable"]["Properties"][0]
-        return {
-            "cid":               p.get("CID"),
-            "iupac_name":        p.get("IUPACName", "N/A"),
-            "molecular_formula": p.get("MolecularFormula", "N/A"),
-            "molecular_weight":  p.get("MolecularWeight"),
-            "exact_mass":        p.get("ExactMass"),
-            "canonical_smiles":  p.get("CanonicalSMILES", "N/A"),
-            "inchi":             p.get("InChI", "N/A"),
-            "inchikey":          p.get("InChIKey", "N/A"),
-            "xlogp3":            p.get("XLogP"),
-            "tpsa":              p.get("TPSA"),
-            "hb_donors":         p.get("HBondDonorCount"),
-            "hb_acceptors":      p.get("HBondAcceptorCount"),
-            "rotatable_bonds":   p.get("RotatableBondCount"),
-            "heavy_atoms":       p.get("HeavyAtomCount"),
-            "charge":            p.get("Charge"),
-            "complexity":        p.get("Complexity"),
-        }
-    except Exception as e:
-        return {"_error": f"PubChem fetch failed: {str(e)}"}
+
+def _fetch_pubchem(compound_name=None, cid=None):
+    """Fetch compound data from PubChem PUG REST API."""
+    if cid:
+        url = _PUBCHEM_URL_CID.format(cid)
+    else:
+        encoded = _quote(compound_name)
+        url = _PUBCHEM_URL_NAME.format(encoded)
+
+    try:
+        res = SESSION.get(url, timeout=15)
+        # PubChem answers unknown names/CIDs with 404 and malformed or
+        # out-of-range ones with 400 — client errors, not an outage
+        if res.status_code in (400, 404):
+            return {"_error": f"PubChem returned no results for: {compound_name or cid}"}
+        res.raise_for_status()
+        raw = orjson.loads(res.content)
+    except (requests.RequestException, ValueError):
+        log.exception("PubChem fetch failed for %s", compound_name or cid)
+        return _PUBCHEM_UNAVAILABLE
+
+    props = (raw.get("PropertyTable") or {}).get("Properties")
+    if not props:
+        return {"_error": f"PubChem returned no results for: {compound_name or cid}"}
+
+    p = props[0]
+    return {
+        "cid":               p.get("CID"),
+        "iupac_name":        p.get("IUPACName", "N/A"),
+        "molecular_formula": p.get("MolecularFormula", "N/A"),
+        "molecular_weight":  p.get("MolecularWeight"),
+        "exact_mass":        p.get("ExactMass"),
+        "canonical_smiles":  p.get("CanonicalSMILES", "N/A"),
+        "inchi":             p.get("InChI", "N/A"),
+        "inchikey":          p.get("InChIKey", "N/A"),
+        "xlogp3":            p.get("XLogP"),
+        "tpsa":              p.get("TPSA"),
+        "hb_donors":         p.get("HBondDonorCount"),
+        "hb_acceptors":      p.get("HBondAcceptorCount"),
+        "rotatable_bonds":   p.get("RotatableBondCount"),
+        "heavy_atoms":       p.get("HeavyAtomCount"),
+        "charge":            p.get("Charge"),
+        "complexity":        p.get("Complexity"),
+    }
 
 
 # ── RCSB PDB ──────────────────────────────────────────────────
+RCSB_GRAPHQL_URL = "https://data.rcsb.org/graphql"
+
+_PDB_UNAVAILABLE = {"_error": "PDB fetch failed: service unavailable"}
+
+# Entry + polymer entity fields in one round-trip
+_PDB_QUERY = """
+query ($id: String!) {
+  entry(entry_id: $id) {
+    struct { title }
+    rcsb_entry_info {
+      resolution_combined
+      polymer_entity_count
+      nonpolymer_entity_count
+      deposited_atom_count
+      experimental_method
+    }
+    exptl { method }
+    refine { ls_R_factor_R_free ls_R_factor_R_work ls_d_res_high }
+    polymer_entities {
+      rcsb_polymer_entity { pdbx_description }
+      rcsb_polymer_entity_container_identifiers { entity_id uniprot_ids }
+    }
+  }
+}
+"""
+
+
 def fetch_pdb(pdb_id):
-    """Fetch protein structure data from RCSB PDB REST API."""
+    """
+    Fetch protein structure data from RCSB, served from cache / in-flight
+    fetch when possible. pdb_id must already be stripped and uppercased.
+    """
+    with _PDB_LOCK:
+        cached = _PDB.get(pdb_id)
+    if cached is not None:
+        return cached
+
+    def load():
+        result = _fetch_pdb(pdb_id)
+        if "_error" not in result:
+            with _PDB_LOCK:
+                _PDB[pdb_id] = result
+        return result
+
+    return _single_flight(("pdb", pdb_id), load)
+
+
+def _fetch_pdb(pdb_id):
+    """Fetch protein structure data from the RCSB PDB GraphQL API."""
     try:
-        entry_url  = f"https://data.rcsb.org/rest/v1/core/entry/{pdb_id}"
-        entity_url = f"https://data.rcsb.org/rest/v1/core/polymer_entity/{pdb_id}/1"
-
-        entry_res  = requests.get(entry_url,  timeout=15)
-        entity_res = requests.get(entity_url, timeout=15)
-        entry  = entry_res.json()
-        entity = entity_res.json() if entity_res.status_code == 200 else {}
-
-        if "struct" not in entry:
-            return {"_error": f"No PDB data found for ID: {pdb_id}"}
-
-        info    = entry.get("rcsb_entry_info", {})
-        exptl   = (entry.get("exptl") or [{}])[0]
-        refine  = (entry.get("refine") or [{}])[0]
-        struct  = entry.get("struct", {})
-        rcsb_e  = entity.get("rcsb_polymer_entity", {})
-        e_ids   = entity.get("rcsb_entity_container_identifiers", {})
-
-        res_list   = info.get("resolution_combined", [])
-        resolution = res_list[0] if res_list else refine.get("ls_d_res_high")
-
-        if resolution is None:        quality = "unknown"
-        elif resolution < 2.0:        quality = "excellent (< 2.0 Å)"
-        elif resolution < 2.5:        quality = "good (2.0–2.5 Å)"
-        elif resolution < 3.0:        quality = "moderate (2.5–3.0 Å)"
-        else:                         quality = "limited (> 3.0 Å)"
-
-        return {
-            "pdb_id":              pdb_id,
-            "title":               struct.get("title", "N/A"),
-            "protein_name":        rcsb_e.get("pdbx_description", struct.get("title", "N/A")),
-            "experimental_method": exptl.get("method", info.get("experimental_method", "N/A")),
-            "resolution_angstrom": resolution,
-            "resolution_quality":  quality,
-            "r_free":              refine.get("ls_rfactor_rfree"),
-            "r_work":              refine.get("ls_rfactor_rwork"),
-            "polymer_chains":      info.get("polymer_entity_count"),
-            "nonpolymer_count":    info.get("nonpolymer_entity_count", 0),
-            "has_ligand":          (info.get("nonpolymer_entity_count") or 0) > 0,
-            "deposited_atoms":     info.get("deposited_atom_count"),
-            "uniprot_ids":         e_ids.get("uniprot_ids", []),
-        }
-    except Exception as e:
-        return {"_error": f"PDB fetch failed: {str(e)}"}
+        res = SESSION.post(
+            RCSB_GRAPHQL_URL,
+            json={"query": _PDB_QUERY, "variables": {"id": pdb_id}},
+            timeout=15,
+        )
+        res.raise_for_status()
+        raw = orjson.loads(res.content)
+    except (requests.RequestException, ValueError):
+        log.exception("PDB fetch failed for %s", pdb_id)
+        return _PDB_UNAVAILABLE
+
+    # GraphQL reports query/schema failures as HTTP 200 + "errors"; don't
+    # let those masquerade as a missing PDB ID
+    if raw.get("errors"):
+        log.error("RCSB GraphQL errors for %s: %s", pdb_id, raw["errors"])
+        if not raw.get("data"):
+            return _PDB_UNAVAILABLE
+
+    entry = (raw.get("data") or {}).get("entry") or {}
+
+    if not entry.get("struct"):
+        return {"_error": f"No PDB data found for ID: {pdb_id}"}
+
+    info     = entry.get("rcsb_entry_info") or {}
+    exptl    = (entry.get("exptl") or [{}])[0]
+    refine   = (entry.get("refine") or [{}])[0]
+    struct   = entry["struct"]
+    entities = entry.get("polymer_entities") or [{}]
+    # Prefer entity 1, as the REST polymer_entity/{id}/1 lookup did
+    entity   = next(
+        (e for e in entities
+         if (e.get("rcsb_polymer_entity_container_identifiers") or {}).get("entity_id") == "1"),
+        entities[0],
+    )
+    rcsb_e   = entity.get("rcsb_polymer_entity") or {}
+    e_ids    = entity.get("rcsb_polymer_entity_container_identifiers") or {}
+
+    res_list   = info.get("resolution_combined") or []
+    resolution = res_list[0] if res_list else refine.get("ls_d_res_high")
+
+    if resolution is None:        quality = "unknown"
+    elif resolution < 2.0:        quality = "excellent (< 2.0 Å)"
+    elif resolution < 2.5:        quality = "good (2.0–2.5 Å)"
+    elif resolution < 3.0:        quality = "moderate (2.5–3.0 Å)"
+    else:                         quality = "limited (> 3.0 Å)"
+
+    return {
+        "pdb_id":              pdb_id,
+        "title":               struct.get("title") or "N/A",
+        "protein_name":        rcsb_e.get("pdbx_description") or struct.get("title") or "N/A",
+        "experimental_method": exptl.get("method") or info.get("experimental_method") or "N/A",
+        "resolution_angstrom": resolution,
+        "resolution_quality":  quality,
+        "r_free":              refine.get("ls_R_factor_R_free"),
+        "r_work":              refine.get("ls_R_factor_R_work"),
+        "polymer_chains":      info.get("polymer_entity_count"),
+        "nonpolymer_count":    info.get("nonpolymer_entity_count") or 0,
+        "has_ligand":          (info.get("nonpolymer_entity_count") or 0) > 0,
+        "deposited_atoms":     info.get("deposited_atom_count"),
+        "uniprot_ids":         e_ids.get("uniprot_ids") or [],
+    }
 
 
 # ── NVIDIA API ────────────────────────────────────────────────
-def call_nvidia(payload):
-    """Send assembled payload to NVIDIA API and return the report."""
+_NVIDIA_HEADERS = {
+    "Content-Type":  "application/json",
+    "Authorization": f"Bearer {NVIDIA_API_KEY}",
+}
+
+_SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+
+_NVIDIA_BODY_BASE = {
+    "model":       NVIDIA_MODEL,
+    "temperature": 0.1,
+    "max_tokens":  4096,
+}
+
+
+def _nvidia_post(payload, stream=False):
+    """POST the assembled payload to the NVIDIA chat completions endpoint."""
+    # Compact JSON without absent sections — fewer prompt tokens to prefill
+    clean = {k: v for k, v in payload.items() if v is not None}
     user_message = (
         "BIOCORE ANALYSIS PAYLOAD:\n\n"
-        + json.dumps(payload, indent=2)
+        + orjson.dumps(clean).decode()
         + "\n\nExecute Steps 1 through 7 in full."
     )
 
-    headers = {
-        "Content-Type":  "application/json",
-        "Authorization": f"Bearer {NVIDIA_API_KEY}",
-    }
-
     body = {
-        "model":       NVIDIA_MODEL,
-        "temperature": 0.1,
-        "max_tokens":  4096,
+        **_NVIDIA_BODY_BASE,
+        "stream": stream,
         "messages": [
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user",   "content": user_message},
+            _SYSTEM_MESSAGE,
+            {"role": "user", "content": user_message},
         ],
     }
 
-    res  = requests.post(NVIDIA_URL, headers=headers, json=body, timeout=120)
-    data = res.json()
+    res = SESSION.post(NVIDIA_URL, headers=_NVIDIA_HEADERS, json=body, timeout=120, stream=stream)
 
     if not res.ok:
-        raise Exception(f"NVIDIA API error {res.status_code}: {json.dumps(data)}")
+        raise Exception(f"NVIDIA API error {res.status_code}: {res.text}")
 
+    return res
+
+
+def call_nvidia(payload):
+    """Send assembled payload to NVIDIA API and return the report."""
+    data = orjson.loads(_nvidia_post(payload).content)
     return data["choices"][0]["message"]["content"]
 
 
+def stream_nvidia(payload):
+    """
+    Send assembled payload to NVIDIA API with streaming enabled.
+
+    The request is issued eagerly so upstream errors raise here. Returns
+    the open response; read it with iter_nvidia_tokens() and close it
+    when done.
+    """
+    return _nvidia_post(payload, stream=True)
+
+
+def iter_nvidia_tokens(res):
+    """Yield report text chunks from a streaming NVIDIA response."""
+    # Split raw bytes: decoding first would break lines on NEL / U+2028,
+    # which UTF-8 report text (e.g. "Å") can contain
+    for line in res.iter_lines():
+        if not line.startswith(b"data:"):
+            continue
+        data = line[len(b"data:"):].strip()
+        if data == b"[DONE]":
+            break
+        choices = orjson.loads(data).get("choices") or [{}]
+        content = (choices[0].get("delta") or {}).get("content")
+        if content:
+            yield content
+
+
+# ── Connection warm-up ────────────────────────────────────────
+_WARMUP_URLS = (
+    ("HEAD",    "https://pubchem.ncbi.nlm.nih.gov/"),
+    ("HEAD",    "https://data.rcsb.org/"),
+    ("OPTIONS", "https://integrate.api.nvidia.com/"),
+)
+
+
+def _warm_connections():
+    for method, url in _WARMUP_URLS:
+        try:
+            SESSION.request(method, url, timeout=5)
+        except requests.RequestException:
+            log.warning("Warm-up to %s failed", url)
+
+
+def warm_connections():
+    """
+    Pre-open pooled connections (DNS + TCP + TLS) to PubChem, RCSB and
+    NVIDIA so the first real request reuses a warm socket. Runs on the
+    shared executor so an upstream outage never delays startup.
+    """
+    EXECUTOR.submit(_warm_connections)
+
+
 # ── Routes ────────────────────────────────────────────────────
 @app.route("/biocore", methods=["POST"])
 def biocore_agent():
@@ -195,36 +473,51 @@ def biocore_agent():
       "pdb_id": "1EQG",              // required, 4-char PDB ID
       "docking_results": {...},       // optional
       "swissdock_results": {...},     // optional
-      "pymol_data": {...}             // optional
+      "pymol_data": {...},            // optional
+      "stream": false                 // optional, stream report as SSE
     }
+
+    With "stream": true the report is returned as text/event-stream,
+    one `data: {"content": "..."}` event per chunk, ending in
+    `data: [DONE]`. A failure mid-stream sends `data: {"error": "..."}`
+    before `[DONE]`.
     """
     try:
         body = request.get_json()
         if not body:
-            return jsonify({"status": "error", "message": "No JSON body received"}), 400
+            return ojson({"status": "error", "message": "No JSON body received"}, 400)
 
         compound_name   = body.get("compound_name")
+        if isinstance(compound_name, str):
+            compound_name = compound_name.strip()   # one value for cache key and URL
         cid             = body.get("cid")
-        pdb_id          = (body.get("pdb_id") or "").upper().strip()
+        pdb_id          = str(body.get("pdb_id") or "").strip().upper()
         docking_results = body.get("docking_results")
         swissdock       = body.get("swissdock_results")
         pymol_data      = body.get("pymol_data")
+        stream          = body.get("stream") is True
 
         # Validate
         if not compound_name and not cid:
-            return jsonify({"status": "error", "message": "Provide compound_name or cid"}), 400
-        if not pdb_id or len(pdb_id) != 4:
-            return jsonify({"status": "error", "message": "Provide a valid 4-char pdb_id e.g. 1EQG"}), 400
+            return ojson({"status": "error", "message": "Provide compound_name or cid"}, 400)
+        # compound_name is already stripped, so whitespace-only names are empty here
+        if compound_name is not None and not (isinstance(compound_name, str) and _NAME_RE.fullmatch(compound_name)):
+            return ojson({"status": "error", "message": "Invalid compound_name"}, 400)
+        if cid and not (str(cid).isdecimal() and int(cid) > 0):
+            return ojson({"status": "error", "message": "Invalid cid — must be a positive integer"}, 400)
+        if cid:
+            cid = int(cid)   # 3672 and "3672" share cache / in-flight keys
+        if not _PDB_RE.fullmatch(pdb_id):
+            return ojson({"status": "error", "message": "Provide a valid 4-char pdb_id e.g. 1EQG"}, 400)
         if not NVIDIA_API_KEY:
-            return jsonify({"status": "error", "message": "NVIDIA_API_KEY not configured on server"}), 500
-
-        print(f"\n[BioCore] Compound: {compound_name or cid}  |  Target: {pdb_id}")
+            return ojson({"status": "error", "message": "NVIDIA_API_KEY not configured on server"}, 500)
 
-        print("[BioCore] → Fetching PubChem...")
-        compound = fetch_pubchem(compound_name=compound_name, cid=cid)
+        log.info("Compound: %s  |  Target: %s", compound_name or cid, pdb_id)
 
-        print("[BioCore] → Fetching RCSB PDB...")
-        target = fetch_pdb(pdb_id)
+        log.info("→ Fetching PubChem + RCSB PDB...")
+        f_comp   = EXECUTOR.submit(fetch_pubchem, compound_name=compound_name, cid=cid)
+        target   = fetch_pdb(pdb_id)
+        compound = f_comp.result()
 
         payload = {
             "compound":  compound,
@@ -234,11 +527,30 @@ def biocore_agent():
             "pymol":     pymol_data,
         }
 
-        print("[BioCore] → Calling NVIDIA API...")
+        if stream:
+            log.info("→ Streaming NVIDIA API...")
+            res = stream_nvidia(payload)
+
+            def events():
+                try:
+                    for chunk in iter_nvidia_tokens(res):
+                        yield b"data: " + orjson.dumps({"content": chunk}) + b"\n\n"
+                    log.info("✓ Done!")
+                except Exception:
+                    log.exception("NVIDIA stream failed")
+                    yield b'data: {"error": "NVIDIA stream interrupted"}\n\n'
+                yield b"data: [DONE]\n\n"
+
+            response = Response(stream_with_context(events()), mimetype="text/event-stream")
+            # Runs even if the client disconnects before the first chunk
+            response.call_on_close(res.close)
+            return response
+
+        log.info("→ Calling NVIDIA API...")
         report = call_nvidia(payload)
-        print("[BioCore] ✓ Done!")
+        log.info("✓ Done!")
 
-        return jsonify({
+        return ojson({
             "status": "success",
             "meta": {
                 "compound_queried": compound_name or cid,
@@ -246,20 +558,20 @@ def biocore_agent():
                 "model_used":       NVIDIA_MODEL,
             },
             "report": report,
-        }), 200
+        }, 200)
 
     except Exception as e:
-        print(f"[BioCore] ERROR: {e}")
-        return jsonify({"status": "error", "message": str(e)}), 500
+        log.exception("ERROR: %s", e)
+        return ojson({"status": "error", "message": str(e)}, 500)
 
 
 @app.route("/health", methods=["GET"])
 def health():
-    return jsonify({
+    return ojson({
         "status":     "BioCore agent running",
         "model":      NVIDIA_MODEL,
         "api_key_set": bool(NVIDIA_API_KEY),
-    }), 200
+    }, 200)
 
 
 # ── Entry point ───────────────────────────────────────────────
@@ -270,4 +582,7 @@ if __name__ == "__main__":
     print(f"  Model: {NVIDIA_MODEL}")
     print(f"  API key set: {'YES' if NVIDIA_API_KEY else 'NO ⚠️'}")
     print("=" * 52)
-    app.run(host="0.0.0.0", port=PORT, debug=False)
+    warm_connections()
+    # threaded=True is Flask's default; spelled out because each /biocore
+    # call blocks on upstream I/O and relies on per-request threads
+    app.run(host="0.0.0.0", port=PORT, debug=False, threaded=True)
@@ -0,0 +1,24 @@
+"""
+Gunicorn config for the BioCore agent.
+
+Usage:
+  gunicorn biocore_agent:app
+
+gevent workers patch the stdlib on start-up (before the app is imported),
+so requests / the thread pool yield while waiting on PubChem, RCSB and
+NVIDIA instead of pinning one OS thread per in-flight call.
+"""
+
+import os
+
+bind               = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+worker_class       = "gevent"
+workers            = int(os.environ.get("WEB_CONCURRENCY", 2))
+worker_connections = 200   # keep below FETCH_WORKERS in biocore_agent.py
+timeout            = 180   # NVIDIA call alone may take up to 120s
+
+
+def post_worker_init(worker):
+    """Warm upstream connections in each worker once the app is loaded."""
+    from biocore_agent import warm_connections
+    warm_connections()